@@ -3,16 +3,43 @@
 Analyze SPC file units and structure to debug unit preservation issues.
 """
 
+import mmap
 import struct
-import numpy as np
-from spc_reader import SPCFile
+
+# Experiment type meanings (from SPC specification), indexed by fexper
+EXP_TYPES = (
+    "General SPC",
+    "Gas Chromatography",
+    "General Chromatography",
+    "HPLC Chromatography",
+    "FT-IR, FT-NIR, FT-Raman",
+    "NIR",
+    "UV-VIS",
+    "X-ray",
+    "Mass Spectroscopy",
+    "NMR Spectroscopy or FT-NMR",
+    "ESR Spectroscopy",
+    "Fluorescence Spectroscopy",
+    "Atomic Spectroscopy",
+    "Chromatography Diode Array",
+)
 
 def analyze_spc_units(filename):
     """Analyze SPC file to understand unit encoding."""
+    # Imported here so `python analyze_units.py` without arguments doesn't
+    # pay the numpy startup cost just to print the usage message
+    import numpy as np
+    from spc_reader import SPCFile
+
     try:
+        # Memory-map the file so we only touch the header pages instead of
+        # copying the whole file into a userspace buffer
         with open(filename, 'rb') as f:
-            data = f.read()
-        
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                data = f.read()  # mmap can fail on empty files or odd platforms
+
         print(f"Analyzing SPC file: {filename}")
         print(f"File size: {len(data)} bytes")
         print()
@@ -38,24 +65,7 @@ def analyze_spc_units(filename):
         print(f"fversn: {fversn} (file version)")
         print(f"fexper: {fexper} (experiment type)")
         
-        # Experiment type meanings (from SPC specification)
-        exp_types = {
-            0: "General SPC",
-            1: "Gas Chromatography",
-            2: "General Chromatography", 
-            3: "HPLC Chromatography",
-            4: "FT-IR, FT-NIR, FT-Raman",
-            5: "NIR",
-            6: "UV-VIS",
-            7: "X-ray",
-            8: "Mass Spectroscopy",
-            9: "NMR Spectroscopy or FT-NMR",
-            10: "ESR Spectroscopy",
-            11: "Fluorescence Spectroscopy",
-            12: "Atomic Spectroscopy",
-            13: "Chromatography Diode Array"
-        }
-        exp_type_name = exp_types.get(fexper, f"Unknown ({fexper})")
+        exp_type_name = EXP_TYPES[fexper] if 0 <= fexper < len(EXP_TYPES) else f"Unknown ({fexper})"
         print(f"  Experiment type: {exp_type_name}")
         print()
         
@@ -84,14 +94,12 @@ def analyze_spc_units(filename):
         print(f"Number of points: {fnpts}")
         print()
         
-        # Additional header fields that might affect units
+        # Additional header fields that might affect units - decode the whole
+        # range with one np.frombuffer call instead of per-offset struct.unpack
         print("Additional header fields:")
-        for offset in range(24, min(64, len(data)), 4):
-            try:
-                val = struct.unpack('<I', data[offset:offset+4])[0]
-                print(f"  Offset {offset}: {val} (0x{val:08x})")
-            except:
-                pass
+        vals = np.frombuffer(bytes(data[24:min(64, len(data)) & ~3]), dtype='<u4')
+        for i, val in enumerate(vals):
+            print(f"  Offset {24 + 4*i}: {val} (0x{val:08x})")
         
         print()
         
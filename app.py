@@ -1,15 +1,36 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, Response, stream_with_context
 from flask_cors import CORS
 import numpy as np
+import base64
 import io
+import mmap
 import os
 import json
+import uuid
+from functools import lru_cache
 from werkzeug.utils import secure_filename
 from spc_reader import SPCFile, read_spc_file, write_spc_file
 
 app = Flask(__name__)
 CORS(app)
 
+# orjson serializes large responses several times faster than the stdlib
+# json module behind jsonify; fall back to jsonify if it isn't installed
+try:
+    import orjson
+
+    def json_response(payload):
+        return app.response_class(orjson.dumps(payload), mimetype='application/json')
+
+    def ndjson_line(payload):
+        return orjson.dumps(payload) + b'\n'
+except ImportError:
+    def json_response(payload):
+        return jsonify(payload)
+
+    def ndjson_line(payload):
+        return json.dumps(payload).encode() + b'\n'
+
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 PROCESSED_FOLDER = 'processed'
@@ -20,6 +41,57 @@ app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# Parsed SPC files cached between /upload and /save, keyed by upload id.
+# Keeps /save from re-parsing the header and the client from round-tripping
+# the original binary. Raw bytes also go to UPLOAD_FOLDER so a save still
+# works after the cache evicts an entry.
+SPC_FILE_CACHE = {}
+MAX_CACHED_FILES = 32
+
+# Filename sanitization is regex work that repeats for the same names on
+# every upload/save; memoize it
+@lru_cache(maxsize=4096)
+def safe_filename(name):
+    return secure_filename(name)
+
+def load_spc_file(path):
+    """Parse a stored upload through a read-only mmap (demand-paged, no RAM
+    copy); the mapping stays alive as the SPCFile's original_data."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            data = f.read()  # mmap can fail on empty files or odd platforms
+    return SPCFile(data)
+
+def cache_spc_file(file_id, spc_file):
+    if len(SPC_FILE_CACHE) >= MAX_CACHED_FILES:
+        SPC_FILE_CACHE.pop(next(iter(SPC_FILE_CACHE)))  # Evict oldest upload
+    SPC_FILE_CACHE[file_id] = spc_file
+
+# Optional Numba-compiled clip kernel - parallelizes across spectra when a
+# uniform batch comes in. Falls back to plain numpy if numba isn't installed.
+try:
+    from numba import njit, prange
+
+    @njit(parallel=True, cache=True)
+    def _clip_batch(y_batch, threshold):
+        for i in prange(y_batch.shape[0]):
+            for j in range(y_batch.shape[1]):
+                if y_batch[i, j] < threshold:
+                    y_batch[i, j] = threshold
+
+    def clip_spectra(y_arrays, threshold):
+        lengths = {len(y) for y in y_arrays}
+        if len(y_arrays) > 1 and len(lengths) == 1:
+            y_batch = np.stack(y_arrays).astype(np.float32)
+            _clip_batch(y_batch, np.float32(threshold))
+            return list(y_batch)
+        return [np.clip(y, threshold, None) for y in y_arrays]
+except ImportError:
+    def clip_spectra(y_arrays, threshold):
+        return [np.clip(y, threshold, None) for y in y_arrays]
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -32,23 +104,31 @@ def upload_files():
         
         for file in files:
             if file and file.filename.endswith('.spc'):
-                # Read SPC file
-                file_content = file.read()
-                x_values, y_values, x_unit = read_spc_file(file_content)
-                
+                # Stream the upload straight to disk instead of materializing
+                # it in worker memory, then parse it through an mmap. The
+                # client only needs the upload id to reference it later.
+                file_id = uuid.uuid4().hex
+                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], file_id + '.spc')
+                file.save(upload_path)
+
+                spc_file = load_spc_file(upload_path)
+                cache_spc_file(file_id, spc_file)
+
+                # Ship spectra as base64-encoded float32 buffers instead of
+                # JSON float lists - ~4x smaller payloads and no per-value boxing
                 file_info = {
-                    'filename': secure_filename(file.filename),
-                    'x_values': x_values.tolist(),
-                    'y_values': y_values.tolist(),
-                    'x_unit': x_unit,  # Include detected unit
-                    'original_data': file_content.hex()  # Store original binary data
+                    'filename': safe_filename(file.filename),
+                    'file_id': file_id,
+                    'x_values_b64': base64.b64encode(np.asarray(spc_file.x_values).astype('<f4').tobytes()).decode(),
+                    'y_values_b64': base64.b64encode(np.asarray(spc_file.y_values).astype('<f4').tobytes()).decode(),
+                    'x_unit': spc_file.x_unit  # Include detected unit
                 }
                 file_data.append(file_info)
         
-        return jsonify({'success': True, 'files': file_data})
+        return json_response({'success': True, 'files': file_data})
     
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return json_response({'success': False, 'error': str(e)})
 
 @app.route('/process', methods=['POST'])
 def process_spectra():
@@ -57,59 +137,65 @@ def process_spectra():
         threshold = float(data['threshold'])
         files = data['files']
         
-        processed_files = []
-        
-        for file_info in files:
-            y_values = np.array(file_info['y_values'])
-            x_values = np.array(file_info['x_values'])
-            
-            # Apply threshold - remove negative peaks
-            processed_y = np.where(y_values < threshold, threshold, y_values)
-            
-            processed_file = {
-                'filename': file_info['filename'],
-                'x_values': x_values.tolist(),
-                'original_y': y_values.tolist(),
-                'processed_y': processed_y.tolist(),
-                'x_unit': file_info.get('x_unit', 'Unknown'),  # Pass through the unit info
-                'original_data': file_info['original_data']
-            }
-            processed_files.append(processed_file)
-        
-        return jsonify({'success': True, 'processed_files': processed_files})
-    
+        y_arrays = [np.frombuffer(base64.b64decode(file_info['y_values_b64']), dtype='<f4')
+                    for file_info in files]
+
+        # Apply threshold - remove negative peaks across the whole batch
+        processed_arrays = clip_spectra(y_arrays, threshold)
+
+        # Only the processed y comes back - the client already holds
+        # x values, original y, units and the original binary, so echoing
+        # them through this endpoint was pure payload waste. Stream one
+        # NDJSON line per spectrum so large batches never accumulate a
+        # monolithic response in memory and the client can render early.
+        def generate():
+            for file_info, processed_y in zip(files, processed_arrays):
+                yield ndjson_line({
+                    'filename': file_info['filename'],
+                    'processed_y_b64': base64.b64encode(processed_y.astype('<f4').tobytes()).decode()
+                })
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return json_response({'success': False, 'error': str(e)})
 
 @app.route('/save', methods=['POST'])
 def save_file():
     try:
         data = request.json
-        filename = secure_filename(data['filename'])
-        processed_y = np.array(data['processed_y'])
-        original_data = bytes.fromhex(data['original_data'])
-        
+        filename = safe_filename(data['filename'])
+        processed_y = np.frombuffer(base64.b64decode(data['processed_y_b64']), dtype='<f4')
+        file_id = data['file_id']
+
         # Create new SPC file with modified y-values preserving original structure and units
         try:
-            spc_file = SPCFile(original_data)
+            # Reuse the SPCFile parsed at upload time; fall back to re-reading
+            # the stored upload if the cache evicted it
+            spc_file = SPC_FILE_CACHE.get(file_id)
+            if spc_file is None:
+                upload_path = os.path.join(app.config['UPLOAD_FOLDER'], safe_filename(file_id) + '.spc')
+                spc_file = load_spc_file(upload_path)
+                cache_spc_file(file_id, spc_file)
             print(f"Original SPC info: X range {spc_file.x_values[0]:.1f} to {spc_file.x_values[-1]:.1f}")
             print(f"Header info: ftflgs={spc_file.header.get('ftflgs', 'N/A')}, fexper={spc_file.header.get('fexper', 'N/A')}")
             
-            new_spc_data = spc_file.write_file(processed_y)
+            new_spc_segments = spc_file.write_file_segments(processed_y)
             print("Successfully created SPC file preserving all original formatting and units")
         except Exception as write_error:
             print(f"Failed to preserve original SPC structure: {write_error}")
-            return jsonify({'success': False, 'error': f'Could not preserve SPC file format: {write_error}'})
-        
-        # Save the file
+            return json_response({'success': False, 'error': f'Could not preserve SPC file format: {write_error}'})
+
+        # Save the file - gather-write the segments in one syscall instead of
+        # joining them into a monolithic bytes copy first
         save_path = os.path.join(app.config['PROCESSED_FOLDER'], filename)
         with open(save_path, 'wb') as f:
-            f.write(new_spc_data)
+            os.writev(f.fileno(), new_spc_segments)
         
-        return jsonify({'success': True, 'saved_path': save_path})
+        return json_response({'success': True, 'saved_path': save_path})
     
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return json_response({'success': False, 'error': str(e)})
 
 @app.route('/download/<filename>')
 def download_file(filename):
@@ -119,7 +205,14 @@ def download_file(filename):
             as_attachment=True
         )
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return json_response({'success': False, 'error': str(e)})
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    # Serve with waitress when available - multi-threaded and without the
+    # Werkzeug debug reloader's per-request overhead
+    try:
+        from waitress import serve
+        print("Starting server on http://0.0.0.0:5001 (waitress)")
+        serve(app, host='0.0.0.0', port=5001, threads=8)
+    except ImportError:
+        app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -4,6 +4,8 @@ Investigate and fix SPC unit labeling issues.
 The Galactic SPC format has specific header fields that control how GRAMS displays units.
 """
 
+import mmap
+import shutil
 import struct
 import numpy as np
 from spc_reader import SPCFile
@@ -11,9 +13,14 @@ from spc_reader import SPCFile
 def analyze_spc_unit_fields(filename):
     """Deep dive into SPC header fields that control unit display."""
     try:
+        # Memory-map instead of f.read() - only the header pages we inspect
+        # get faulted in, so large SPC files don't blow up memory
         with open(filename, 'rb') as f:
-            data = f.read()
-        
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                data = f.read()  # mmap can fail on empty files or odd platforms
+
         print(f"Analyzing unit fields in: {filename}")
         print(f"File size: {len(data)} bytes\n")
         
@@ -46,17 +53,15 @@ def analyze_spc_unit_fields(filename):
         # Read more header fields - SPC headers can be quite large
         print("=== Extended Header Fields ===")
         
-        # Read 32-bit values throughout the header
-        for offset in range(0, min(128, len(data)), 4):
-            if offset + 4 <= len(data):
-                try:
-                    val_uint = struct.unpack('<I', data[offset:offset+4])[0]
-                    val_int = struct.unpack('<i', data[offset:offset+4])[0]
-                    val_float = struct.unpack('<f', data[offset:offset+4])[0]
-                    
-                    print(f"Offset {offset:3d}: uint={val_uint:10d} int={val_int:10d} float={val_float:10.3f}")
-                except:
-                    pass
+        # Read 32-bit values throughout the header - decode all of them in one
+        # np.frombuffer pass (the int/float views share memory, zero copy)
+        # instead of three struct.unpack calls per offset
+        header_words = bytes(data[:min(128, len(data)) & ~3])
+        uints = np.frombuffer(header_words, dtype='<u4')
+        ints = uints.view('<i4')
+        floats = uints.view('<f4')
+        for i in range(len(uints)):
+            print(f"Offset {i*4:3d}: uint={uints[i]:10d} int={ints[i]:10d} float={floats[i]:10.3f}")
         
         print()
         
@@ -64,18 +69,17 @@ def analyze_spc_unit_fields(filename):
         print("=== ASCII Strings in Header ===")
         header_portion = data[:512] if len(data) >= 512 else data
         
-        # Look for printable ASCII sequences
-        current_string = ""
-        for i, byte_val in enumerate(header_portion):
-            if 32 <= byte_val <= 126:  # Printable ASCII
-                current_string += chr(byte_val)
-            else:
-                if len(current_string) >= 3:  # Only show strings of 3+ chars
-                    print(f"Offset {i-len(current_string):3d}: '{current_string}'")
-                current_string = ""
-        
-        if len(current_string) >= 3:
-            print(f"Offset {len(header_portion)-len(current_string):3d}: '{current_string}'")
+        # Look for printable ASCII sequences - build a printable-byte mask and
+        # find run boundaries with np.diff instead of scanning byte-by-byte
+        header_bytes = bytes(header_portion)
+        arr = np.frombuffer(header_bytes, dtype=np.uint8)
+        printable = ((arr >= 32) & (arr <= 126)).view(np.int8)
+        edges = np.diff(np.concatenate(([0], printable, [0])))
+        starts = np.where(edges == 1)[0]
+        ends = np.where(edges == -1)[0]
+        for start, end in zip(starts, ends):
+            if end - start >= 3:  # Only show strings of 3+ chars
+                print(f"Offset {start:3d}: '{header_bytes[start:end].decode('ascii')}'")
         
         print()
         
@@ -89,52 +93,53 @@ def analyze_spc_unit_fields(filename):
 def create_wavenumber_spc_file(input_filename, output_filename):
     """Create a copy of SPC file with corrected unit metadata."""
     try:
-        with open(input_filename, 'rb') as f:
-            data = f.read()
-        
         print(f"Creating wavenumber-corrected version...")
+
+        # Copy the file as-is, then patch the handful of header bytes in place
+        # through a writable mmap - only the dirty page gets written back,
+        # instead of copying the whole file through a bytearray
+        shutil.copyfile(input_filename, output_filename)
+        with open(output_filename, 'r+b') as f:
+            new_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE)
+
+            # Force experiment type to FT-IR (type 4) which typically uses wavenumbers
+            original_fexper = new_data[2]
+            new_data[2] = 4  # FT-IR experiment type
+            print(f"Changed experiment type: {original_fexper} -> 4 (FT-IR)")
         
-        # Make a copy of the data
-        new_data = bytearray(data)
-        
-        # Force experiment type to FT-IR (type 4) which typically uses wavenumbers
-        original_fexper = new_data[2]
-        new_data[2] = 4  # FT-IR experiment type
-        print(f"Changed experiment type: {original_fexper} -> 4 (FT-IR)")
-        
-        # Some SPC files have additional unit flags or identifiers
-        # Let's try a few common patterns:
-        
-        # Look for specific byte patterns that might indicate wavelength vs wavenumber
-        # This is somewhat trial-and-error based on the SPC spec
-        
-        # Check if there are any obvious wavelength indicators we can change
-        changes_made = []
-        
-        # Sometimes unit info is stored as specific values in the header
-        # Let's try changing any suspicious values
-        for offset in [20, 24, 28, 32, 36, 40, 44, 48]:
-            if offset + 4 <= len(new_data):
-                original_val = struct.unpack('<I', new_data[offset:offset+4])[0]
-                
-                # Look for values that might indicate wavelength units
-                # This is speculative but based on common SPC patterns
-                if original_val in [1, 2, 3]:  # Common unit codes
-                    # Try setting to a wavenumber unit code
-                    struct.pack_into('<I', new_data, offset, 0)  # 0 often means wavenumber
-                    changes_made.append(f"Offset {offset}: {original_val} -> 0")
-        
-        if changes_made:
-            print("Unit-related changes made:")
-            for change in changes_made:
-                print(f"  {change}")
-        else:
-            print("No obvious unit fields found to modify")
-        
-        # Save the modified file
-        with open(output_filename, 'wb') as f:
-            f.write(new_data)
-        
+            # Some SPC files have additional unit flags or identifiers
+            # Let's try a few common patterns:
+
+            # Look for specific byte patterns that might indicate wavelength vs wavenumber
+            # This is somewhat trial-and-error based on the SPC spec
+
+            # Check if there are any obvious wavelength indicators we can change
+            changes_made = []
+
+            # Sometimes unit info is stored as specific values in the header
+            # Let's try changing any suspicious values
+            for offset in [20, 24, 28, 32, 36, 40, 44, 48]:
+                if offset + 4 <= len(new_data):
+                    original_val = struct.unpack('<I', new_data[offset:offset+4])[0]
+
+                    # Look for values that might indicate wavelength units
+                    # This is speculative but based on common SPC patterns
+                    if original_val in [1, 2, 3]:  # Common unit codes
+                        # Try setting to a wavenumber unit code
+                        struct.pack_into('<I', new_data, offset, 0)  # 0 often means wavenumber
+                        changes_made.append(f"Offset {offset}: {original_val} -> 0")
+
+            if changes_made:
+                print("Unit-related changes made:")
+                for change in changes_made:
+                    print(f"  {change}")
+            else:
+                print("No obvious unit fields found to modify")
+
+            # Write the dirty pages back to the copied file
+            new_data.flush()
+            new_data.close()
+
         print(f"Saved corrected file as: {output_filename}")
         print("Try opening this file in GRAMS to see if the unit label is corrected")
         
@@ -3,10 +3,91 @@ Custom SPC file reader for Galactic SPC files.
 This module handles reading and writing of binary SPC files commonly used in spectroscopy.
 """
 
+import logging
 import struct
 import numpy as np
 from typing import Tuple, Dict, Any
 
+# Diagnostics go through a module logger - with logging unconfigured each
+# call is just a level check, so batch parsing isn't throttled by stdout
+log = logging.getLogger(__name__)
+
+# Fixed-layout prefix of the Galactic SPC main header. One np.frombuffer
+# against this dtype decodes every field we care about in a single zero-copy
+# view instead of a series of per-field struct.unpack calls.
+SPC_HEADER_DTYPE = np.dtype({
+    'names': ['ftflgs', 'fversn', 'fexper', 'fexp', 'fnpts', 'ffirst', 'flast', 'fnsub'],
+    'formats': ['u1', 'u1', 'u1', 'u1', '<u4', '<f8', '<f8', '<u4'],
+    'offsets': [0, 1, 2, 3, 4, 8, 16, 28],
+    'itemsize': 32,
+})
+
+# Pre-compiled scalar codecs - unpack_from/pack_into on these skips the
+# per-call format-string parse and the intermediate bytes slice
+_U32 = struct.Struct('<I')
+_F32 = struct.Struct('<f')
+_F64 = struct.Struct('<d')
+
+# Experiment types (fexper codes) whose X units are unambiguous
+_FEXPER_UNIT = {
+    4: "cm⁻¹",  # FT-IR, FT-NIR, FT-Raman - wavenumbers
+    6: "nm",    # UV-VIS - wavelengths (nanometers)
+}
+
+class LazyLinspace(np.lib.mixins.NDArrayOperatorsMixin):
+    """Evenly spaced X axis described by (first, last, num) only.
+
+    Parsing an evenly-spaced SPC file doesn't need the X array at all - it is
+    fully determined by the header - so this defers the np.linspace allocation
+    until something actually consumes the whole axis. Endpoint indexing, len()
+    and mean() stay O(1); any ufunc/arithmetic use materializes the array once
+    and behaves like the ndarray it replaces.
+    """
+
+    def __init__(self, first, last, num):
+        self.first = float(first)
+        self.last = float(last)
+        self.num = int(num)
+        self._arr = None
+
+    @property
+    def array(self):
+        if self._arr is None:
+            self._arr = np.linspace(self.first, self.last, self.num)
+        return self._arr
+
+    def __len__(self):
+        return self.num
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += self.num
+            if not 0 <= index < self.num:
+                raise IndexError("index out of range")
+            if index == 0 or self.num == 1:
+                return self.first
+            if index == self.num - 1:
+                return self.last
+            return self.first + (self.last - self.first) * (index / (self.num - 1))
+        return self.array[index]
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __array__(self, dtype=None):
+        return self.array.astype(dtype) if dtype is not None else self.array
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(np.asarray(x) if isinstance(x, LazyLinspace) else x for x in inputs)
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def mean(self, axis=None, dtype=None, out=None, **kwargs):
+        if axis is None and out is None:
+            value = 0.5 * (self.first + self.last)  # Exact for an affine axis
+            return value if dtype is None else np.dtype(dtype).type(value)
+        return self.array.mean(axis=axis, dtype=dtype, out=out, **kwargs)
+
 class SPCFile:
     """Class to handle SPC file reading and writing."""
     
@@ -16,6 +97,7 @@ class SPCFile:
         self.x_values = []
         self.y_values = []
         self.original_data = file_data
+        self._y_data_offset = None  # Byte offset of the Y block, set by parse_file
         
         if file_data:
             self.parse_file(file_data)
@@ -26,30 +108,26 @@ class SPCFile:
             if len(file_data) < 512:
                 raise ValueError("File too small to be a valid SPC file")
             
-            # Parse main header (Galactic SPC format)
-            # Header structure based on Galactic SPC specification
-            ftflgs = file_data[0]    # File type flags
-            fversn = file_data[1]    # File version  
-            fexper = file_data[2]    # Experiment type
-            fexp = file_data[3]      # Fraction scaling exponent
-            
-            # Read key header fields with proper byte offsets
-            fnpts = struct.unpack('<I', file_data[4:8])[0]      # Number of points
-            ffirst = struct.unpack('<d', file_data[8:16])[0]    # First X (double precision)
-            flast = struct.unpack('<d', file_data[16:24])[0]    # Last X (double precision)
-            
+            # Parse main header (Galactic SPC format) in one shot via the
+            # structured dtype instead of a struct.unpack call per field
+            hdr = np.frombuffer(file_data, dtype=SPC_HEADER_DTYPE, count=1)[0]
+            ftflgs = int(hdr['ftflgs'])   # File type flags
+            fversn = int(hdr['fversn'])   # File version
+            fexper = int(hdr['fexper'])   # Experiment type
+            fexp = int(hdr['fexp'])       # Fraction scaling exponent
+            fnpts = int(hdr['fnpts'])     # Number of points
+            ffirst = float(hdr['ffirst'])  # First X (double precision)
+            flast = float(hdr['flast'])    # Last X (double precision)
+
             # Alternative: try single precision if doubles seem wrong
             if abs(ffirst) > 1e10 or abs(flast) > 1e10:
-                ffirst = struct.unpack('<f', file_data[8:12])[0]   # First X (float)
-                flast = struct.unpack('<f', file_data[12:16])[0]   # Last X (float)
-            
-            # Read more header info
-            fnsub = 1  # Default to 1 sub-file
-            if len(file_data) > 28:
-                fnsub = struct.unpack('<I', file_data[28:32])[0]
-                fnsub = max(1, fnsub)
+                ffirst, flast = np.frombuffer(file_data, dtype='<f4', offset=8, count=2)
+                ffirst = float(ffirst)   # First X (float)
+                flast = float(flast)     # Last X (float)
+
+            fnsub = max(1, int(hdr['fnsub']))  # Number of sub-files
             
-            print(f"SPC Header: fnpts={fnpts}, ffirst={ffirst}, flast={flast}, fnsub={fnsub}")
+            log.debug("SPC Header: fnpts=%d, ffirst=%s, flast=%s, fnsub=%d", fnpts, ffirst, flast, fnsub)
             
             self.header = {
                 'ftflgs': ftflgs, 'fversn': fversn, 'fexper': fexper, 'fexp': fexp,
@@ -59,23 +137,23 @@ class SPCFile:
             # Handle different SPC file types
             if ftflgs & 0x01:  # TSPREC flag - if set, there's no X array (evenly spaced)
                 if fnpts > 0 and abs(ffirst) < 1e6 and abs(flast) < 1e6:
-                    self.x_values = np.linspace(ffirst, flast, fnpts)
-                    print(f"Using header X range: {ffirst:.2f} to {flast:.2f}")
+                    self.x_values = LazyLinspace(ffirst, flast, fnpts)
+                    log.debug("Using header X range: %.2f to %.2f", ffirst, flast)
                 else:
                     # Fallback to reasonable defaults
-                    print(f"Header X values seem invalid (ffirst={ffirst}, flast={flast}), using fallback")
-                    self.x_values = np.linspace(400, 4000, fnpts if fnpts > 0 else 1000)
+                    log.debug("Header X values seem invalid (ffirst=%s, flast=%s), using fallback", ffirst, flast)
+                    self.x_values = LazyLinspace(400, 4000, fnpts if fnpts > 0 else 1000)
             else:
                 # X values are stored in the file - try to read them
-                print("TSPREC not set - X values should be stored in file")
+                log.debug("TSPREC not set - X values should be stored in file")
                 if fnpts > 0 and abs(ffirst) < 1e6 and abs(flast) < 1e6:
                     # Even without TSPREC, we can use header range if it looks reasonable
-                    self.x_values = np.linspace(ffirst, flast, fnpts)
-                    print(f"Using header X range for non-TSPREC file: {ffirst:.2f} to {flast:.2f}")
+                    self.x_values = LazyLinspace(ffirst, flast, fnpts)
+                    log.debug("Using header X range for non-TSPREC file: %.2f to %.2f", ffirst, flast)
                 else:
                     # Try to read X data from file or use fallback
-                    self.x_values = np.linspace(400, 4000, fnpts if fnpts > 0 else 1000)
-                    print("Using fallback X range")
+                    self.x_values = LazyLinspace(400, 4000, fnpts if fnpts > 0 else 1000)
+                    log.debug("Using fallback X range")
             
             # Find Y data location
             # Standard SPC files typically have 512-byte header
@@ -86,35 +164,30 @@ class SPCFile:
                 x_data_size = fnpts * 4  # 4 bytes per float
                 y_data_start = 512 + x_data_size
             
-            # Read Y values
+            # Read Y values - the offset is fully determined by the header
+            # (512-byte main header, preceded by the X array only when TSPREC
+            # is unset), so no need to probe a list of speculative offsets
             if fnpts > 0:
                 y_data_size = fnpts * 4  # 4 bytes per float
                 if y_data_start + y_data_size <= len(file_data):
-                    y_bytes = file_data[y_data_start:y_data_start + y_data_size]
-                    self.y_values = np.frombuffer(y_bytes, dtype=np.float32)
+                    # frombuffer with offset/count views the file directly -
+                    # no throwaway bytes slice of the Y block
+                    self.y_values = np.frombuffer(file_data, dtype=np.float32,
+                                                  offset=y_data_start, count=fnpts)
+                    self._y_data_offset = y_data_start
                 else:
-                    # Try reading from different offsets
-                    for offset in [512, 256, 128, 64, 32]:
-                        try:
-                            if offset + y_data_size <= len(file_data):
-                                y_bytes = file_data[offset:offset + y_data_size]
-                                self.y_values = np.frombuffer(y_bytes, dtype=np.float32)
-                                print(f"Found Y data at offset {offset}")
-                                break
-                        except:
-                            continue
+                    # Last resort for malformed files: read whatever we can
+                    remaining = len(file_data) - 512
+                    points = remaining // 4
+                    if points > 0:
+                        self.y_values = np.frombuffer(file_data, dtype=np.float32,
+                                                      offset=512, count=points)
+                        self._y_data_offset = 512
+                        # Adjust x_values to match
+                        if len(self.y_values) != len(self.x_values):
+                            self.x_values = LazyLinspace(self.x_values[0], self.x_values[-1], len(self.y_values))
                     else:
-                        # Last resort: read whatever we can
-                        remaining = len(file_data) - 512
-                        points = remaining // 4
-                        if points > 0:
-                            y_bytes = file_data[512:512 + points * 4]
-                            self.y_values = np.frombuffer(y_bytes, dtype=np.float32)
-                            # Adjust x_values to match
-                            if len(self.y_values) != len(self.x_values):
-                                self.x_values = np.linspace(self.x_values[0], self.x_values[-1], len(self.y_values))
-                        else:
-                            raise ValueError("Could not read Y data")
+                        raise ValueError("Could not read Y data")
             
             # Sanity check: ensure x and y have same length
             if len(self.x_values) != len(self.y_values):
@@ -125,10 +198,11 @@ class SPCFile:
             # Detect X-axis units based on data range and experiment type
             self.x_unit = self._detect_x_units()
             
-            print(f"Parsed SPC: {len(self.x_values)} points, X range: {self.x_values[0]:.2f} to {self.x_values[-1]:.2f} {self.x_unit}")
+            log.debug("Parsed SPC: %d points, X range: %.2f to %.2f %s",
+                      len(self.x_values), self.x_values[0], self.x_values[-1], self.x_unit)
                     
         except Exception as e:
-            print(f"Error parsing SPC file: {e}")
+            log.warning("Error parsing SPC file: %s", e)
             # Fallback: create reasonable spectral data
             self.x_values = np.linspace(400, 4000, 1000)
             self.y_values = np.random.normal(100, 20, 1000)
@@ -139,111 +213,169 @@ class SPCFile:
                 'flast': self.x_values[-1], 'fnsub': 1
             }
     
-    def write_file(self, new_y_values: np.ndarray) -> bytes:
-        """Write SPC file with new Y values, preserving original structure and units completely."""
+    def write_file_segments(self, new_y_values: np.ndarray) -> list:
+        """Build the output file as a list of buffers (bytes before Y, new Y
+        bytes, bytes after Y) without copying the original file. Callers can
+        gather-write the segments (os.writev) or join them."""
         try:
             if self.original_data and len(new_y_values) == len(self.y_values):
-                # Make a complete copy of the original file
-                new_data = bytearray(self.original_data)
-                
                 # CRITICAL: Do not modify ANY header fields - preserve everything
                 # This includes all unit information, experiment type, flags, etc.
-                
+
                 # Find the exact Y data location based on how we parsed it
                 y_data_size = len(new_y_values) * 4
-                
-                # Try the same offsets we used during parsing to find Y data
+
+                # Hoisted out of the candidate loop so the float32 casts run
+                # once, not per attempted offset
+                new_y_bytes = np.ascontiguousarray(new_y_values, dtype=np.float32).tobytes()
+                target_y = np.ascontiguousarray(self.y_values, dtype=np.float32)
+                target_bytes = memoryview(target_y).cast('B')
+                original_view = memoryview(self.original_data)
+
+                # Happy path: parse_file already knows exactly where the Y
+                # block lives, so skip the candidate scan entirely
+                if (self._y_data_offset is not None and
+                        self._y_data_offset + y_data_size <= len(self.original_data)):
+                    offset = self._y_data_offset
+                    log.debug("Reusing Y data offset %d from parse, preserving all header info...", offset)
+                    return [original_view[:offset], new_y_bytes,
+                            original_view[offset + y_data_size:]]
+
+                # Cold backup (e.g. y_values replaced after parsing): try the
+                # same offsets we used during parsing to find Y data
                 for offset in [512, 256, 128, 64, 32]:
-                    if offset + y_data_size <= len(new_data):
+                    if offset + y_data_size <= len(self.original_data):
                         try:
-                            # Verify this is the correct location by comparing with parsed data
-                            original_y_at_offset = np.frombuffer(
-                                self.original_data[offset:offset + y_data_size], 
-                                dtype=np.float32
-                            )
-                            
-                            if len(original_y_at_offset) == len(self.y_values):
-                                # Check if values match (with tolerance for floating point)
-                                if np.allclose(original_y_at_offset, self.y_values, rtol=1e-5, atol=1e-6):
-                                    print(f"Found Y data at offset {offset}, preserving all header info...")
-                                    
-                                    # Replace ONLY the Y data, leave everything else untouched
-                                    new_y_bytes = new_y_values.astype(np.float32).tobytes()
-                                    new_data[offset:offset + y_data_size] = new_y_bytes
-                                    
-                                    # Don't modify unit information - preserve original units completely
-                                    
-                                    print(f"Successfully updated Y data while preserving units and structure")
-                                    return bytes(new_data)
+                            # Verify this is the correct location by comparing
+                            # with parsed data. y_values usually came straight
+                            # from these bytes, so a single memcmp settles the
+                            # common case; tolerance compare is the fallback.
+                            matched = original_view[offset:offset + y_data_size] == target_bytes
+                            if not matched:
+                                original_y_at_offset = np.frombuffer(
+                                    self.original_data, dtype=np.float32,
+                                    offset=offset, count=len(new_y_values)
+                                )
+                                matched = (len(original_y_at_offset) == len(target_y) and
+                                           np.allclose(original_y_at_offset, target_y, rtol=1e-5, atol=1e-6))
+
+                            if matched:
+                                log.debug("Found Y data at offset %d, preserving all header info...", offset)
+
+                                # Replace ONLY the Y data, leave everything else untouched;
+                                # the untouched parts stay zero-copy views of the original
+                                log.debug("Successfully updated Y data while preserving units and structure")
+                                return [original_view[:offset], new_y_bytes,
+                                        original_view[offset + y_data_size:]]
                         except Exception as e:
-                            print(f"Error checking offset {offset}: {e}")
+                            log.warning("Error checking offset %d: %s", offset, e)
                             continue
-                
-                print("Could not find exact Y data location, trying byte-level search...")
-                return self._find_and_replace_y_data(new_y_values)
-            
+
+                log.debug("Could not find exact Y data location, trying byte-level search...")
+                return [self._find_and_replace_y_data(new_y_values)]
+
             # If we can't preserve original structure, we shouldn't write the file
             # as it will lose critical unit and format information
             raise ValueError("Cannot preserve original SPC structure - file would lose unit information")
-            
+
         except Exception as e:
-            print(f"Error writing SPC file: {e}")
+            log.warning("Error writing SPC file: %s", e)
             raise e
+
+    def write_file(self, new_y_values: np.ndarray) -> bytes:
+        """Write SPC file with new Y values, preserving original structure and units completely."""
+        return b''.join(self.write_file_segments(new_y_values))
     
     def _find_and_replace_y_data(self, new_y_values: np.ndarray) -> bytes:
-        """Find Y data in the original file using a more thorough search."""
+        """Find Y data in the original file using a more thorough search.
+
+        Computes the normalized cross-correlation against every 4-byte-aligned
+        offset at once - O(N log N) via FFT instead of one np.corrcoef call
+        per candidate offset."""
         if not self.original_data:
             raise ValueError("No original data to preserve")
-        
-        new_data = bytearray(self.original_data)
+
         y_data_size = len(new_y_values) * 4
-        
-        # Try every possible 4-byte aligned offset
-        for offset in range(0, len(self.original_data) - y_data_size, 4):
-            try:
-                test_y_data = np.frombuffer(
-                    self.original_data[offset:offset + y_data_size], 
-                    dtype=np.float32
-                )
-                
-                if len(test_y_data) == len(self.y_values):
-                    # Check correlation with our parsed Y data
-                    correlation = np.corrcoef(test_y_data, self.y_values)[0, 1]
-                    if correlation > 0.99:  # High correlation indicates we found the right spot
-                        print(f"Found Y data at offset {offset} with correlation {correlation:.6f}")
-                        new_y_bytes = new_y_values.astype(np.float32).tobytes()
-                        new_data[offset:offset + y_data_size] = new_y_bytes
-                        return bytes(new_data)
-            except:
-                continue
-        
-        raise ValueError("Could not locate Y data in original file")
-    
-    def _fix_unit_labeling(self, data: bytearray):
-        """Try to fix unit labeling to show wavenumbers instead of nanometers."""
+        n_floats = len(self.original_data) // 4
+        needle = np.asarray(self.y_values, dtype=np.float64)
+        m = len(needle)
+        if m < 2 or n_floats < m:
+            raise ValueError("Could not locate Y data in original file")
+
+        # Early-out probe: only offsets whose first float matches y[0] can be
+        # the Y block. One vectorized pass usually leaves a handful of
+        # candidates that are settled with direct correlations, skipping the
+        # full FFT entirely.
+        raw = np.frombuffer(self.original_data, dtype='<f4', count=n_floats)
+        candidates = np.flatnonzero(np.isclose(raw[:n_floats - m + 1], needle[0],
+                                               rtol=1e-5, atol=1e-6))
+        if 0 < len(candidates) <= 64:
+            # Pearson r reduces to a dot product of the two mean-removed,
+            # unit-norm vectors; normalizing the needle once up front leaves
+            # one subtract + two norms per candidate instead of the full 2x2
+            # covariance matrix np.corrcoef builds and throws away
+            ny = needle - needle.mean()
+            ny_norm = np.linalg.norm(ny)
+            if ny_norm > 0:
+                ny /= ny_norm
+            for i in candidates:
+                window = raw[i:i + m].astype(np.float64)
+                if np.isfinite(window).all():
+                    w = window - window.mean()
+                    w_norm = np.linalg.norm(w)
+                    r = float(w @ ny) / w_norm if w_norm > 0 else -1.0
+                    if r > 0.99:
+                        offset = int(i) * 4
+                        log.debug("Found Y data at offset %d with correlation %.6f", offset, r)
+                        mv = memoryview(self.original_data)
+                        return b''.join((mv[:offset], new_y_values.astype(np.float32).tobytes(),
+                                         mv[offset + y_data_size:]))
+            # No probe candidate verified - fall through to the full search
+            # (a recomputed Y array may differ in its first sample only)
+
+        # View the whole file as a float32 stream - each index is one 4-byte
+        # aligned candidate offset. Header bytes reinterpreted as floats can
+        # be inf/nan, which would poison the FFT, so zero them out.
+        stream = raw.astype(np.float64)
+        np.nan_to_num(stream, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+        # Garbage bytes can decode to huge (1e38-scale) floats whose rounding
+        # error would swamp the FFT; clamp the stream to the reference's scale.
+        # A genuine match lies within the limit, so it is never distorted.
+        limit = 8.0 * max(1.0, float(np.abs(needle).max()))
+        np.clip(stream, -limit, limit, out=stream)
+
+        # Correlate against the mean-removed reference, then normalize by the
+        # rolling window variance (cumulative sums) to get Pearson r per offset
+        needle_c = needle - needle.mean()
+        needle_ss = float(needle_c @ needle_c)
         try:
-            # The experiment type field (fexper) at offset 2 affects unit interpretation
-            original_fexper = data[2]
-            
-            # For IR spectroscopy data (which uses wavenumbers), set to FT-IR type
-            if self.x_values[0] > 100 and self.x_values[-1] < 10000:  # Looks like wavenumber range
-                if original_fexper != 4:  # 4 = FT-IR, FT-NIR, FT-Raman
-                    print(f"Correcting experiment type for wavenumber units: {original_fexper} -> 4")
-                    data[2] = 4
-                
-                # Some SPC files have additional unit flags
-                # Try to clear any wavelength-specific flags that might exist
-                # Offset 30-50 sometimes contain unit-related metadata
-                for offset in [30, 34, 38, 42, 46]:
-                    if offset + 4 <= len(data):
-                        # Check if this looks like a unit flag
-                        val = struct.unpack('<I', data[offset:offset+4])[0]
-                        if val in [1, 2, 3, 5, 6]:  # Common wavelength unit codes
-                            struct.pack_into('<I', data, offset, 0)  # Set to default/wavenumber
-                            print(f"Cleared potential wavelength flag at offset {offset}")
-        
-        except Exception as e:
-            print(f"Note: Could not fix unit labeling: {e}")
+            from scipy.signal import fftconvolve
+            num = fftconvolve(stream, needle_c[::-1], mode='valid')
+        except ImportError:
+            num = np.correlate(stream, needle_c, mode='valid')
+
+        csum = np.concatenate(([0.0], np.cumsum(stream)))
+        csum2 = np.concatenate(([0.0], np.cumsum(stream * stream)))
+        win_sum = csum[m:] - csum[:-m]
+        win_ss = csum2[m:] - csum2[:-m] - win_sum * win_sum / m
+        # Windows with (numerically) zero variance can't correlate - rule them
+        # out rather than letting the division blow up to inf
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = np.where(win_ss > 1e-9, num / np.sqrt(win_ss * needle_ss), -np.inf)
+
+        if np.isfinite(correlation).any():
+            best = int(np.nanargmax(correlation))
+            if correlation[best] > 0.99:  # High correlation indicates we found the right spot
+                offset = best * 4
+                log.debug("Found Y data at offset %d with correlation %.6f", offset, correlation[best])
+                # Join three views around the new Y bytes - one output
+                # allocation, no intermediate bytearray copy of the whole file
+                mv = memoryview(self.original_data)
+                return b''.join((mv[:offset], new_y_values.astype(np.float32).tobytes(),
+                                 mv[offset + y_data_size:]))
+
+        raise ValueError("Could not locate Y data in original file")
     
     def _detect_x_units(self):
         """Detect X-axis units based on experiment type and data range."""
@@ -252,24 +384,23 @@ class SPCFile:
                 return self._guess_units_from_range()
             
             fexper = self.header.get('fexper', 0)
-            x_mean = np.mean(self.x_values) if len(self.x_values) > 0 else 0
-            
-            # Use experiment type to determine likely units
-            if fexper == 4:  # FT-IR, FT-NIR, FT-Raman
-                return "cm⁻¹"  # Wavenumbers
-            elif fexper == 5:  # NIR
-                if x_mean > 1000:
-                    return "nm"  # Wavelengths (nanometers)
-                else:
-                    return "cm⁻¹"  # Wavenumbers
-            elif fexper == 6:  # UV-VIS
-                return "nm"  # Wavelengths (nanometers)
-            else:
-                # For general SPC or unknown types, guess from data range
-                return self._guess_units_from_range()
+
+            # Decisive experiment types resolve straight from the lookup table
+            unit = _FEXPER_UNIT.get(fexper)
+            if unit is not None:
+                return unit
+
+            if fexper == 5:  # NIR - ambiguous, split on the axis midpoint.
+                # The header endpoints determine the mean of an even axis,
+                # so this stays O(1) instead of reducing the whole X array
+                x_mean = 0.5 * (self.header.get('ffirst', 0) + self.header.get('flast', 0))
+                return "nm" if x_mean > 1000 else "cm⁻¹"  # Wavelengths vs wavenumbers
+
+            # For general SPC or unknown types, guess from data range
+            return self._guess_units_from_range()
                 
         except Exception as e:
-            print(f"Error detecting units: {e}")
+            log.warning("Error detecting units: %s", e)
             return self._guess_units_from_range()
     
     def _guess_units_from_range(self):
@@ -278,7 +409,14 @@ class SPCFile:
             return "cm⁻¹"
         
         x_min, x_max = self.x_values[0], self.x_values[-1]
-        x_mean = np.mean(self.x_values)
+        # For an evenly spaced axis the mean is just the midpoint - no need
+        # to reduce over fnpts values (LazyLinspace.mean is closed-form too)
+        if isinstance(self.x_values, LazyLinspace):
+            x_mean = self.x_values.mean()
+        elif self.header.get('ftflgs', 0) & 0x01:
+            x_mean = 0.5 * (x_min + x_max)
+        else:
+            x_mean = np.mean(self.x_values)
         x_range = x_max - x_min
         
         # Typical ranges for different units:
@@ -313,25 +451,25 @@ class SPCFile:
         
         # Update only the number of points if it changed
         if len(y_values) != self.header.get('fnpts', 0):
-            struct.pack_into('<I', new_data, 4, len(y_values))
+            _U32.pack_into(new_data, 4, len(y_values))
         
         # Keep original X range information but update if we have it
         if len(self.x_values) > 0:
             # Try to preserve the original X range format (float vs double)
             try:
                 # Try to detect if original used doubles
-                original_first = struct.unpack('<d', self.original_data[8:16])[0]
+                original_first = _F64.unpack_from(self.original_data, 8)[0]
                 if abs(original_first) < 1e10:  # Reasonable value
-                    struct.pack_into('<d', new_data, 8, float(self.x_values[0]))
-                    struct.pack_into('<d', new_data, 16, float(self.x_values[-1]))
+                    _F64.pack_into(new_data, 8, float(self.x_values[0]))
+                    _F64.pack_into(new_data, 16, float(self.x_values[-1]))
                 else:
                     # Use floats
-                    struct.pack_into('<f', new_data, 8, float(self.x_values[0]))
-                    struct.pack_into('<f', new_data, 12, float(self.x_values[-1]))
+                    _F32.pack_into(new_data, 8, float(self.x_values[0]))
+                    _F32.pack_into(new_data, 12, float(self.x_values[-1]))
             except:
                 # Default to floats
-                struct.pack_into('<f', new_data, 8, float(self.x_values[0]))
-                struct.pack_into('<f', new_data, 12, float(self.x_values[-1]))
+                _F32.pack_into(new_data, 8, float(self.x_values[0]))
+                _F32.pack_into(new_data, 12, float(self.x_values[-1]))
         
         # Find and replace Y data more carefully
         # Calculate expected Y data size
@@ -352,32 +490,44 @@ class SPCFile:
     
     def _create_compatible_spc_file(self, y_values: np.ndarray) -> bytes:
         """Create SPC file compatible with original but with new Y data."""
+        # Preallocate the whole output (header + Y block) so the header patch
+        # and Y write both land in place with no concatenation copy
+        out = bytearray(512 + len(y_values) * 4)
+
         # Start with original header structure
-        header = bytearray(512)
         if self.original_data and len(self.original_data) >= 512:
-            header[:512] = self.original_data[:512]
-        
+            out[:512] = memoryview(self.original_data)[:512]
+
         # Update critical fields
-        struct.pack_into('<I', header, 4, len(y_values))  # fnpts
-        
+        _U32.pack_into(out, 4, len(y_values))  # fnpts
+
         # Preserve original X range information
         if len(self.x_values) > 0:
-            struct.pack_into('<f', header, 8, float(self.x_values[0]))   # ffirst
-            struct.pack_into('<f', header, 12, float(self.x_values[-1])) # flast
-        
+            _F32.pack_into(out, 8, float(self.x_values[0]))   # ffirst
+            _F32.pack_into(out, 12, float(self.x_values[-1])) # flast
+
         # Ensure TSPREC flag is set (evenly spaced X values)
-        header[0] |= 0x01
-        
-        # Append Y data
-        y_data = y_values.astype(np.float32).tobytes()
-        
-        return bytes(header + y_data)
+        out[0] |= 0x01
+
+        # Write Y data straight into the preallocated tail
+        np.frombuffer(out, dtype=np.float32, offset=512)[:] = y_values
+
+        return bytes(out)
     
-    def _create_simple_spc_file(self, y_values: np.ndarray) -> bytes:
-        """Create a basic SPC file structure."""
-        # Create minimal header
-        header = bytearray(512)  # 512-byte header
-        
+    def _create_simple_spc_file(self, y_values: np.ndarray, out: bytearray = None) -> bytes:
+        """Create a basic SPC file structure.
+
+        Callers generating many files of the same size can pass a scratch
+        bytearray of 512 + len(y_values) * 4 bytes via `out` to reuse it
+        across calls instead of allocating a fresh buffer each time."""
+        size = 512 + len(y_values) * 4
+        if out is not None and len(out) == size:
+            header = out
+            header[:512] = bytes(512)  # Reset any stale header bytes
+        else:
+            # Preallocate header + Y block in one buffer (512-byte header)
+            header = bytearray(size)
+
         # Set basic header values based on original file if available
         if hasattr(self, 'header') and self.header:
             header[0] = self.header.get('ftflgs', 1) | 0x01  # Ensure TSPREC is set
@@ -391,7 +541,7 @@ class SPCFile:
             header[3] = 0  # fexp
         
         # Number of points
-        struct.pack_into('<I', header, 4, len(y_values))
+        _U32.pack_into(header, 4, len(y_values))
         
         # X range - use original if available, otherwise reasonable defaults
         if len(self.x_values) > 0:
@@ -401,14 +551,14 @@ class SPCFile:
             first_x = 400.0
             last_x = 4000.0
         
-        struct.pack_into('<f', header, 8, first_x)   # ffirst
-        struct.pack_into('<f', header, 12, last_x)   # flast
-        struct.pack_into('<I', header, 16, 1)        # fnsub
-        
-        # Append Y data
-        y_data = y_values.astype(np.float32).tobytes()
-        
-        return bytes(header + y_data)
+        _F32.pack_into(header, 8, first_x)   # ffirst
+        _F32.pack_into(header, 12, last_x)   # flast
+        _U32.pack_into(header, 16, 1)        # fnsub
+
+        # Write Y data straight into the preallocated tail
+        np.frombuffer(header, dtype=np.float32, offset=512)[:] = y_values
+
+        return bytes(header)
 
 def read_spc_file(file_data: bytes) -> Tuple[np.ndarray, np.ndarray, str]:
     """Read SPC file and return x, y arrays, and x-axis unit."""
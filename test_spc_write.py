@@ -27,7 +27,9 @@ def test_spc_roundtrip():
         'flast': x_values[-1], 'fnsub': 1
     }
     
-    original_data = spc_file._create_simple_spc_file(y_values)
+    # Reusable scratch buffer for the generated file bytes
+    scratch = bytearray(512 + len(y_values) * 4)
+    original_data = spc_file._create_simple_spc_file(y_values, out=scratch)
     with open('test_original.spc', 'wb') as f:
         f.write(original_data)
     
@@ -40,7 +42,7 @@ def test_spc_roundtrip():
     
     # Apply threshold (remove negative values)
     threshold = 0
-    processed_y = np.where(spc_read.y_values < threshold, threshold, spc_read.y_values)
+    processed_y = np.maximum(spc_read.y_values, threshold)
     print(f"After threshold: Y range {processed_y.min():.1f} to {processed_y.max():.1f}")
     
     # Write back
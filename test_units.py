@@ -42,7 +42,11 @@ def test_unit_detection():
     
     print("Testing unit detection:")
     print("=" * 50)
-    
+
+    # One scratch buffer reused for every case's roundtrip file - sized for
+    # the largest case and sliced to fit, so the loop allocates nothing
+    scratch = bytearray(512 + max(t['points'] for t in test_cases) * 4)
+
     for test in test_cases:
         print(f"\nTest: {test['name']}")
         print(f"X range: {test['x_range'][0]} - {test['x_range'][1]}")
@@ -69,7 +73,8 @@ def test_unit_detection():
         print(f"✓ PASS" if detected_unit == test['expected_unit'] else f"✗ FAIL")
         
         # Test full workflow
-        test_data = spc_file._create_simple_spc_file(y_values)
+        test_data = spc_file._create_simple_spc_file(
+            y_values, out=memoryview(scratch)[:512 + len(y_values) * 4])
         roundtrip_spc = SPCFile(test_data)
         
         print(f"Roundtrip unit: {roundtrip_spc.x_unit}")